@@ -7,8 +7,10 @@ import asyncio
 import json
 import logging
 import os
+import stat
 import sys
-from typing import Any, Dict, List
+import threading
+from typing import Any, Dict, List, Optional
 
 import chromadb
 from chromadb.config import Settings
@@ -16,10 +18,34 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from openai import OpenAI
 
+try:
+    import orjson
+except ImportError:  # orjson이 없으면 표준 json으로 직렬화
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# stdio 전송 설정
+STDIO_READ_LIMIT = int(os.getenv("MCP_STDIO_READ_LIMIT", str(16 * 1024 * 1024)))
+STDIO_WRITE_QUEUE_SIZE = int(os.getenv("MCP_STDIO_WRITE_QUEUE_SIZE", "64"))
+
+def dumps_json(obj: Any) -> bytes:
+    """JSON을 UTF-8 바이트로 직렬화합니다. orjson이 있으면 사용합니다."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            # 64비트 범위를 넘는 정수 id 등은 표준 json으로 직렬화
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
 class TaxDocumentMCPServer:
     def __init__(self):
         self.chroma_host = os.getenv("CHROMA_HOST", "localhost")
@@ -142,138 +168,411 @@ class TaxDocumentMCPServer:
             logger.error(f"문서 정보 조회 중 오류 발생: {e}")
             return f"문서 정보 조회 중 오류가 발생했습니다: {str(e)}"
 
-async def handle_mcp_request():
-    """MCP 요청을 처리합니다."""
-    server = TaxDocumentMCPServer()
+def _error_response(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    """JSON-RPC 오류 응답을 만듭니다."""
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {
+            "code": code,
+            "message": message
+        }
+    }
+
+async def process_request(server: TaxDocumentMCPServer, request: Any) -> Optional[Dict[str, Any]]:
+    """단일 JSON-RPC 요청을 처리하고 응답을 반환합니다. 응답이 없으면 None을 반환합니다."""
+    if not isinstance(request, dict):
+        logger.warning(f"잘못된 요청 형식: {request!r}")
+        return _error_response(None, -32600, "Invalid Request")
     
-    while True:
-        try:
-            # stdin에서 요청 읽기
-            line = await asyncio.get_event_loop().run_in_executor(None, sys.stdin.readline)
-            if not line or line.strip() == "":
-                continue
-            
-            try:
-                request = json.loads(line.strip())
-            except json.JSONDecodeError as e:
-                logger.warning(f"JSON 파싱 오류, 무시: {e}")
-                continue
-            
-            # ID가 null이면 건너뛰기
-            if request.get("id") is None:
-                logger.warning("ID가 null인 요청 무시")
-                continue
-            
-            # 요청 처리
-            if request.get("method") == "initialize":
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request.get("id"),
-                    "result": {
-                        "protocolVersion": "2024-11-05",
-                        "capabilities": {
-                            "tools": {
-                                "listChanged": False
-                            }
-                        },
-                        "serverInfo": {
-                            "name": "tax-document-mcp",
-                            "version": "1.0.0"
+    # ID가 null이면 건너뛰기
+    if request.get("id") is None:
+        logger.warning("ID가 null인 요청 무시")
+        return None
+    
+    try:
+        # 요청 처리
+        if request.get("method") == "initialize":
+            response = {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "result": {
+                    "protocolVersion": "2024-11-05",
+                    "capabilities": {
+                        "tools": {
+                            "listChanged": False
                         }
+                    },
+                    "serverInfo": {
+                        "name": "tax-document-mcp",
+                        "version": "1.0.0"
                     }
                 }
-            
-            elif request.get("method") == "tools/list":
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request.get("id"),
-                    "result": {
-                        "tools": [
-                            {
-                                "name": "search_document",
-                                "description": "2025년 세법 개정안 문서에서 관련 내용을 검색하고 AI로 요약합니다.",
-                                "inputSchema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "query": {
-                                            "type": "string",
-                                            "description": "검색할 쿼리 (예: '소득세', '법인세', '부가가치세' 등)"
-                                        },
-                                        "max_results": {
-                                            "type": "integer",
-                                            "description": "최대 결과 수 (기본값: 5)",
-                                            "default": 5
-                                        }
+            }
+        
+        elif request.get("method") == "tools/list":
+            response = {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "result": {
+                    "tools": [
+                        {
+                            "name": "search_document",
+                            "description": "2025년 세법 개정안 문서에서 관련 내용을 검색하고 AI로 요약합니다.",
+                            "inputSchema": {
+                                "type": "object",
+                                "properties": {
+                                    "query": {
+                                        "type": "string",
+                                        "description": "검색할 쿼리 (예: '소득세', '법인세', '부가가치세' 등)"
                                     },
-                                    "required": ["query"]
-                                }
-                            },
-                            {
-                                "name": "get_document_info",
-                                "description": "저장된 문서의 정보를 조회합니다.",
-                                "inputSchema": {
-                                    "type": "object",
-                                    "properties": {},
-                                    "additionalProperties": False
-                                }
+                                    "max_results": {
+                                        "type": "integer",
+                                        "description": "최대 결과 수 (기본값: 5)",
+                                        "default": 5
+                                    }
+                                },
+                                "required": ["query"]
                             }
-                        ]
-                    }
-                }
-            
-            elif request.get("method") == "tools/call":
-                name = request.get("params", {}).get("name")
-                arguments = request.get("params", {}).get("arguments", {})
-                
-                if name == "search_document":
-                    query = arguments.get("query", "")
-                    max_results = arguments.get("max_results", 5)
-                    result = await server.search_document(query, max_results)
-                elif name == "get_document_info":
-                    result = await server.get_document_info()
-                else:
-                    result = f"알 수 없는 도구: {name}"
-                
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request.get("id"),
-                    "result": {
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": result
+                        },
+                        {
+                            "name": "get_document_info",
+                            "description": "저장된 문서의 정보를 조회합니다.",
+                            "inputSchema": {
+                                "type": "object",
+                                "properties": {},
+                                "additionalProperties": False
                             }
-                        ]
-                    }
+                        }
+                    ]
                 }
+            }
+        
+        elif request.get("method") == "tools/call":
+            name = request.get("params", {}).get("name")
+            arguments = request.get("params", {}).get("arguments", {})
             
+            if name == "search_document":
+                query = arguments.get("query", "")
+                max_results = arguments.get("max_results", 5)
+                result = await server.search_document(query, max_results)
+            elif name == "get_document_info":
+                result = await server.get_document_info()
             else:
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request.get("id"),
-                    "error": {
-                        "code": -32601,
-                        "message": "Method not found"
-                    }
+                result = f"알 수 없는 도구: {name}"
+            
+            response = {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "result": {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": result
+                        }
+                    ]
                 }
+            }
+        
+        else:
+            response = _error_response(request.get("id"), -32601, "Method not found")
+        
+        return response
+    
+    except Exception as e:
+        logger.error(f"요청 처리 중 오류 발생: {e}")
+        return _error_response(request.get("id"), -32603, f"Internal error: {str(e)}")
+
+def _use_pipe_transport(fd: int) -> bool:
+    """fd에 asyncio 파이프 전송을 연결해도 되는지 확인합니다.
+    
+    connect_read_pipe/connect_write_pipe는 fd에 O_NONBLOCK을 설정하는데, 이 플래그는
+    open file description 단위라서 터미널(tty)을 공유하는 셸이나 stderr 로깅에도 영향을 줍니다.
+    따라서 파이프/소켓일 때만 사용하고, Windows(proactor)나 tty에서는 스레드/executor를 사용합니다.
+    """
+    if sys.platform == "win32" or fcntl is None:
+        return False
+    try:
+        if os.isatty(fd):
+            return False
+        mode = os.fstat(fd).st_mode
+    except OSError:
+        return False
+    return stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)
+
+class _StdoutProtocol(asyncio.Protocol):
+    """stdout 파이프 쓰기용 프로토콜 (pause_writing/resume_writing 흐름 제어)"""
+    
+    def __init__(self):
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+        self._closed = asyncio.Event()
+    
+    def pause_writing(self):
+        self._can_write.clear()
+    
+    def resume_writing(self):
+        self._can_write.set()
+    
+    def connection_lost(self, exc):
+        self._can_write.set()
+        self._closed.set()
+    
+    async def drain(self):
+        """전송 버퍼가 충분히 비워질 때까지 대기합니다."""
+        await self._can_write.wait()
+    
+    async def wait_closed(self):
+        """남은 버퍼를 모두 쓰고 파이프가 닫힐 때까지 대기합니다."""
+        await self._closed.wait()
+
+class _ThreadReadTransport(asyncio.ReadTransport):
+    """스레드에서 StreamReader에 데이터를 공급할 때 쓰는 흐름 제어용 전송 객체
+    
+    StreamReader는 버퍼가 limit의 2배를 넘으면 pause_reading(), limit 이하로 줄면
+    resume_reading()을 호출합니다. 읽기 스레드는 일시 정지 상태가 풀릴 때까지 대기합니다.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self._closing = False
+    
+    def pause_reading(self):
+        self.resumed.clear()
+    
+    def resume_reading(self):
+        self.resumed.set()
+    
+    def is_reading(self) -> bool:
+        return self.resumed.is_set()
+    
+    def is_closing(self) -> bool:
+        return self._closing
+    
+    def close(self):
+        self._closing = True
+        self.resumed.set()
+
+class StdioTransport:
+    """asyncio 기반 stdio 전송 계층 (줄 단위 JSON 프레이밍)"""
+    
+    def __init__(self, read_limit: int = STDIO_READ_LIMIT, queue_size: int = STDIO_WRITE_QUEUE_SIZE):
+        self.read_limit = read_limit
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.stdin_transport: Optional[asyncio.BaseTransport] = None
+        self.stdout_transport: Optional[asyncio.WriteTransport] = None
+        self.stdout_protocol: Optional[_StdoutProtocol] = None
+        self.write_queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=queue_size)
+        self.writer_task: Optional[asyncio.Task] = None
+        self._saved_flags: Dict[int, int] = {}
+    
+    async def start(self):
+        """stdin을 StreamReader에 연결하고 writer 태스크를 시작합니다."""
+        loop = asyncio.get_running_loop()
+        
+        self.reader = asyncio.StreamReader(limit=self.read_limit)
+        stdin_fd = sys.stdin.fileno()
+        stdout_fd = sys.stdout.fileno()
+        
+        # 파이프/소켓이 아니면(일반 파일, tty, Windows) 스레드에서 읽어 공급
+        self.stdin_transport = None
+        if _use_pipe_transport(stdin_fd):
+            try:
+                self._save_flags(stdin_fd)
+                # fd를 복제해 연결하므로 전송이 닫혀도 fd 0은 열린 채로 남음
+                self.stdin_transport, _ = await loop.connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(self.reader),
+                    os.fdopen(os.dup(stdin_fd), "rb", buffering=0)
+                )
+            except (ValueError, OSError) as e:
+                logger.info(f"stdin 파이프 연결 불가, 스레드 읽기 사용: {e}")
+                self._restore_flags()
+        
+        if self.stdin_transport is None:
+            self.stdin_transport = _ThreadReadTransport()
+            self.reader.set_transport(self.stdin_transport)
+            threading.Thread(
+                target=self._feed_stdin, args=(loop, self.stdin_transport), daemon=True
+            ).start()
+        
+        # 파이프/소켓이 아니거나 stderr와 같은 대상이면 executor로 쓰기
+        self.stdout_transport = None
+        self.stdout_protocol = None
+        if _use_pipe_transport(stdout_fd) and not os.path.sameopenfile(stdout_fd, sys.stderr.fileno()):
+            try:
+                self._save_flags(stdout_fd)
+                self.stdout_transport, self.stdout_protocol = await loop.connect_write_pipe(
+                    _StdoutProtocol, os.fdopen(os.dup(stdout_fd), "wb", buffering=0)
+                )
+            except (ValueError, OSError) as e:
+                logger.info(f"stdout 파이프 연결 불가, executor 쓰기 사용: {e}")
+                self.stdout_transport = None
+                self.stdout_protocol = None
+        
+        self.writer_task = asyncio.create_task(self._writer_loop())
+    
+    def _save_flags(self, fd: int):
+        """fd의 파일 상태 플래그(O_NONBLOCK 등)를 저장합니다."""
+        self._saved_flags[fd] = fcntl.fcntl(fd, fcntl.F_GETFL)
+    
+    def _restore_flags(self):
+        """저장해 둔 파일 상태 플래그를 복원합니다."""
+        for fd, flags in self._saved_flags.items():
+            try:
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+            except OSError as e:
+                logger.warning(f"fd {fd} 플래그 복원 실패: {e}")
+        self._saved_flags.clear()
+    
+    def _feed_stdin(self, loop: asyncio.AbstractEventLoop, transport: _ThreadReadTransport):
+        """블로킹 stdin을 읽어 StreamReader에 공급합니다. (fallback 경로)"""
+        try:
+            while not transport.is_closing():
+                chunk = sys.stdin.buffer.read1(65536)
+                if not chunk:
+                    break
+                # 이벤트 루프에서 공급이 끝날 때까지 기다린 뒤, 버퍼가 가득 찼으면 대기
+                asyncio.run_coroutine_threadsafe(self._feed_chunk(chunk), loop).result()
+                transport.resumed.wait()
+        except Exception as e:
+            logger.error(f"stdin 읽기 중 오류 발생: {e}")
+        finally:
+            try:
+                loop.call_soon_threadsafe(self.reader.feed_eof)
+            except RuntimeError:
+                # 이벤트 루프가 이미 종료된 경우
+                pass
+    
+    async def _feed_chunk(self, chunk: bytes):
+        self.reader.feed_data(chunk)
+    
+    async def read_message(self) -> Optional[bytes]:
+        """한 줄을 읽습니다. EOF이면 None을 반환합니다."""
+        while True:
+            try:
+                line = await self.reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                # EOF: 개행 없이 끝난 마지막 줄이 있으면 반환
+                if e.partial.strip():
+                    return e.partial
+                return None
+            except asyncio.LimitOverrunError as e:
+                # 한 줄이 read_limit를 초과한 경우 해당 줄을 버리고 오류 응답 전송
+                logger.warning(f"메시지 크기 제한({self.read_limit} bytes) 초과, 무시")
+                await self._discard_line(e.consumed)
+                await self.send(_error_response(
+                    None, -32600, f"Invalid Request: message exceeds {self.read_limit} bytes"
+                ))
+                continue
+            except OSError as e:
+                # stdin 읽기 실패는 연결 종료로 처리
+                logger.error(f"stdin 읽기 중 오류 발생: {e}")
+                return None
+            
+            if line.strip():
+                return line
+    
+    async def _discard_line(self, consumed: int):
+        """크기 제한을 초과한 줄을 다음 개행(또는 EOF)까지 버립니다."""
+        while True:
+            await self.reader.readexactly(consumed)
+            try:
+                await self.reader.readuntil(b"\n")
+                return
+            except asyncio.IncompleteReadError:
+                return
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+    
+    async def send(self, message: Any):
+        """메시지를 직렬화하여 쓰기 큐에 넣습니다. 큐가 가득 차면 대기합니다."""
+        await self.write_queue.put(dumps_json(message) + b"\n")
+    
+    async def _writer_loop(self):
+        """쓰기 큐를 비우는 단일 writer 태스크"""
+        loop = asyncio.get_running_loop()
+        while True:
+            data = await self.write_queue.get()
+            try:
+                if data is None:
+                    return
+                if self.stdout_transport is not None:
+                    self.stdout_transport.write(data)
+                    await self.stdout_protocol.drain()
+                else:
+                    await loop.run_in_executor(None, self._blocking_write, data)
+            except Exception as e:
+                logger.error(f"응답 쓰기 중 오류 발생: {e}")
+            finally:
+                self.write_queue.task_done()
+    
+    @staticmethod
+    def _blocking_write(data: bytes):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    
+    async def close(self):
+        """남은 응답을 모두 쓴 뒤 전송을 닫고 fd 플래그를 복원합니다."""
+        if self.writer_task is not None:
+            await self.write_queue.put(None)
+            await self.writer_task
+            self.writer_task = None
+        if self.stdin_transport is not None:
+            self.stdin_transport.close()
+            self.stdin_transport = None
+        if self.stdout_transport is not None:
+            self.stdout_transport.close()
+            await self.stdout_protocol.wait_closed()
+            self.stdout_transport = None
+            self.stdout_protocol = None
+        self._restore_flags()
+
+async def handle_mcp_request():
+    """MCP 요청을 처리합니다."""
+    server = TaxDocumentMCPServer()
+    transport = StdioTransport()
+    await transport.start()
+    
+    try:
+        while True:
+            # stdin에서 요청 읽기
+            line = await transport.read_message()
+            if line is None:
+                logger.info("stdin EOF, 서버를 종료합니다.")
+                break
             
-            # 응답 출력
-            print(json.dumps(response, ensure_ascii=False))
-            sys.stdout.flush()
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                logger.warning(f"JSON 파싱 오류: {e}")
+                await transport.send(_error_response(None, -32700, "Parse error"))
+                continue
             
-        except Exception as e:
-            logger.error(f"요청 처리 중 오류 발생: {e}")
-            if 'request' in locals() and request.get("id") is not None:
-                error_response = {
-                    "jsonrpc": "2.0",
-                    "id": request.get("id"),
-                    "error": {
-                        "code": -32603,
-                        "message": f"Internal error: {str(e)}"
-                    }
-                }
-                print(json.dumps(error_response, ensure_ascii=False))
-                sys.stdout.flush()
+            # 배치 요청 처리
+            if isinstance(request, list):
+                if not request:
+                    await transport.send(_error_response(None, -32600, "Invalid Request"))
+                    continue
+                
+                responses = []
+                for item in request:
+                    response = await process_request(server, item)
+                    if response is not None:
+                        responses.append(response)
+                
+                # 배치 전체가 알림이면 응답하지 않음
+                if responses:
+                    await transport.send(responses)
+                continue
+            
+            response = await process_request(server, request)
+            if response is not None:
+                # 응답 출력
+                await transport.send(response)
+    finally:
+        await transport.close()
 
 async def main():
     """메인 함수"""
@@ -6,17 +6,19 @@ MCP 서버 테스트 스크립트
 import asyncio
 import json
 import logging
+import os
 import subprocess
 import sys
-from typing import Dict, Any
+from typing import Any
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class MCPClientTest:
-    def __init__(self, server_path: str = "python mcp_server.py"):
+    def __init__(self, server_path: str = "python mcp_server_simple_final.py", read_limit: int = 65536):
         self.server_path = server_path
+        self.read_limit = read_limit
         self.process = None
     
     async def start_server(self):
@@ -26,8 +28,9 @@ class MCPClientTest:
                 self.server_path.split(),
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+                stderr=subprocess.DEVNULL,
+                text=True,
+                env={**os.environ, "MCP_STDIO_READ_LIMIT": str(self.read_limit)}
             )
             logger.info("MCP 서버가 시작되었습니다.")
             await asyncio.sleep(2)  # 서버 초기화 대기
@@ -42,10 +45,14 @@ class MCPClientTest:
             self.process.wait()
             logger.info("MCP 서버가 중지되었습니다.")
     
-    async def send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+    async def send_request(self, request: Any) -> Any:
         """MCP 서버에 요청을 보냅니다."""
+        return await self.send_raw(json.dumps(request))
+    
+    async def send_raw(self, line: str) -> Any:
+        """MCP 서버에 한 줄을 그대로 보내고 응답 한 줄을 받습니다."""
         try:
-            request_json = json.dumps(request) + "\n"
+            request_json = line + "\n"
             self.process.stdin.write(request_json)
             self.process.stdin.flush()
             
@@ -148,6 +155,123 @@ class MCPClientTest:
             logger.error(f"컬렉션 목록 조회 실패: {e}")
             return None
 
+    def check(self, name: str, condition: bool, response: Any) -> bool:
+        """검사 결과를 기록합니다."""
+        if condition:
+            logger.info(f"[통과] {name}")
+        else:
+            logger.error(f"[실패] {name}: {json.dumps(response, ensure_ascii=False)[:500]}")
+        return condition
+    
+    async def test_large_id(self):
+        """64비트 범위를 넘는 정수 id가 그대로 돌아오는지 테스트합니다."""
+        logger.info("=== 큰 정수 id 테스트 ===")
+        
+        request_id = 99999999999999999999999
+        request = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "initialize",
+            "params": {}
+        }
+        
+        response = await self.send_request(request)
+        return self.check("큰 정수 id", isinstance(response, dict) and response.get("id") == request_id and "result" in response, response)
+    
+    async def test_batch(self):
+        """배치 요청과 객체가 아닌 배치 항목을 테스트합니다."""
+        logger.info("=== 배치 요청 테스트 ===")
+        
+        request = [
+            {"jsonrpc": "2.0", "id": 10, "method": "tools/list", "params": {}},
+            {"jsonrpc": "2.0", "method": "notifications/initialized"},
+            5
+        ]
+        
+        response = await self.send_request(request)
+        return self.check(
+            "배치 요청",
+            isinstance(response, list)
+            and len(response) == 2
+            and response[0].get("id") == 10 and "result" in response[0]
+            and response[1].get("id") is None and response[1].get("error", {}).get("code") == -32600,
+            response
+        )
+    
+    async def test_empty_batch(self):
+        """빈 배치 요청을 테스트합니다."""
+        logger.info("=== 빈 배치 테스트 ===")
+        
+        response = await self.send_request([])
+        return self.check(
+            "빈 배치",
+            isinstance(response, dict)
+            and response.get("id") is None and response.get("error", {}).get("code") == -32600,
+            response
+        )
+    
+    async def test_non_object_request(self):
+        """객체가 아닌 요청을 테스트합니다."""
+        logger.info("=== 객체가 아닌 요청 테스트 ===")
+        
+        response = await self.send_request(5)
+        return self.check(
+            "객체가 아닌 요청",
+            isinstance(response, dict)
+            and response.get("id") is None and response.get("error", {}).get("code") == -32600,
+            response
+        )
+    
+    async def test_parse_error(self):
+        """잘못된 JSON 요청을 테스트합니다."""
+        logger.info("=== JSON 파싱 오류 테스트 ===")
+        
+        response = await self.send_raw('[{"jsonrpc": "2.0", "id": 11,')
+        return self.check(
+            "JSON 파싱 오류",
+            isinstance(response, dict)
+            and response.get("id") is None and response.get("error", {}).get("code") == -32700,
+            response
+        )
+    
+    async def test_oversize_line(self):
+        """크기 제한을 넘는 줄이 버려지고 다음 요청이 정상 처리되는지 테스트합니다."""
+        logger.info("=== 크기 제한 초과 테스트 ===")
+        
+        request = {
+            "jsonrpc": "2.0",
+            "id": 12,
+            "method": "tools/list",
+            "params": {},
+            "padding": "x" * (self.read_limit * 3)
+        }
+        
+        response = await self.send_request(request)
+        ok = self.check(
+            "크기 제한 초과 오류",
+            isinstance(response, dict)
+            and response.get("id") is None and response.get("error", {}).get("code") == -32600,
+            response
+        )
+        
+        # 버려진 줄 이후에도 요청 경계가 맞는지 확인
+        request = {"jsonrpc": "2.0", "id": 13, "method": "tools/list", "params": {}}
+        response = await self.send_request(request)
+        return self.check("크기 제한 초과 후 재동기화", isinstance(response, dict) and response.get("id") == 13, response) and ok
+    
+    async def test_eof_shutdown(self, timeout: float = 10):
+        """stdin을 닫으면 서버가 정상 종료되는지 테스트합니다."""
+        logger.info("=== stdin EOF 종료 테스트 ===")
+        
+        self.process.stdin.close()
+        try:
+            returncode = await asyncio.get_event_loop().run_in_executor(
+                None, self.process.wait, timeout
+            )
+        except subprocess.TimeoutExpired:
+            return self.check("stdin EOF 종료", False, f"{timeout}초 안에 종료되지 않음")
+        return self.check("stdin EOF 종료", returncode == 0, returncode)
+
 async def main():
     """메인 테스트 함수"""
     client = MCPClientTest()
@@ -172,6 +296,15 @@ async def main():
             await client.test_search_document(query, max_results=2)
             await asyncio.sleep(1)
         
+        # stdio 전송 테스트
+        await client.test_large_id()
+        await client.test_batch()
+        await client.test_empty_batch()
+        await client.test_non_object_request()
+        await client.test_parse_error()
+        await client.test_oversize_line()
+        await client.test_eof_shutdown()
+        
         logger.info("모든 테스트가 완료되었습니다!")
         
     except Exception as e: